@@ -6,29 +6,29 @@ Boucher, Govedič, Saowakon, Swanson 2019
 Contains an implementation of the threshold decryption variant of the Damgard-Jurik cryptosystem.
 
 """
-from functools import lru_cache
-from math import factorial
 from secrets import randbelow
-from typing import Any, List, Tuple
+from threading import Thread
+from typing import Any, Dict, List, Optional, Tuple
 
-from gmpy2 import mpz
+from gmpy2 import comb, fac, get_context, mpz, powmod
 
 from damgard_jurik.prime_gen import gen_safe_prime_pair
 from damgard_jurik.shamir import share_secret
-from damgard_jurik.utils import int_to_mpz, crm, inv_mod, pow_mod
+from damgard_jurik.utils import crm, inv_mod, parallel_map, prod
 
 
 class EncryptedNumber:
     """Represents a number encrypted with a PublicKey."""
 
-    @int_to_mpz
+    __slots__ = ('value', 'public_key')
+
     def __init__(self, value: int, public_key: 'PublicKey'):
         """Initializes the EncryptedNumber.
 
         :param value: The encrypted number.
         :param public_key: The public key used to encrypt `value`.
         """
-        self.value = value
+        self.value = mpz(value)
         self.public_key = public_key
 
     def __add__(self, other: Any) -> 'EncryptedNumber':
@@ -90,7 +90,6 @@ class EncryptedNumber:
 
         return self_inv.__add__(other)
 
-    @int_to_mpz
     def __mul__(self, other: int) -> 'EncryptedNumber':
         """Multiplies an EncryptedNumber by a scalar.
 
@@ -103,15 +102,13 @@ class EncryptedNumber:
         """
         return EncryptedNumber(
             public_key=self.public_key,
-            value=pow(self.value, other, self.public_key.n_s_1)
+            value=powmod(self.value, other, self.public_key.n_s_1)
         )
 
-    @int_to_mpz
     def __rmul__(self, other: int) -> 'EncryptedNumber':
         """See `__mul__`."""
         return self.__mul__(other)
 
-    @int_to_mpz
     def __truediv__(self, other: int):
         """Divides an EncryptedNumber by a scalar.
 
@@ -142,7 +139,6 @@ class EncryptedNumber:
 class PublicKey:
     """Represents a Damgard-Jurik public key."""
 
-    @int_to_mpz
     def __init__(self, n: int, s: int, m: int, threshold: int, delta: int):
         """Initializes the PublicKey and performs pre-computations.
 
@@ -152,40 +148,106 @@ class PublicKey:
         :param threshold: The minimum number of (unique) PrivateKeyShares needed to decrypt an EncryptedNumber.
         :param delta: The factorial of the number of PrivateKeyShares generated.
         """
-        self.n = n
-        self.s = s
-        self.m = m
+        self.n = mpz(n)
+        self.s = mpz(s)
+        self.m = mpz(m)
         self.n_s = self.n ** self.s  # n^s
         self.n_s_1 = self.n_s * self.n  # n^(s+1)
         self.n_s_m = self.n_s * self.m  # n^s * m
-        self.threshold = threshold
-        self.delta = delta
+        self._n_pow = [self.n ** k for k in range(self.s + 2)]  # n^0, n^1, ..., n^(s+1)
+        self._fact_inv = [
+            [inv_mod(fac(k), self._n_pow[j]) for k in range(j + 1)] for j in range(self.s + 1)
+        ]  # _fact_inv[j][k] = (k!)^(-1) (mod n^j)
+        self.threshold = mpz(threshold)
+        self.delta = mpz(delta)
+        self._randomizers = []  # precomputed values of r^(n^s) (mod n^(s+1)), each used at most once
+
+    def _gen_randomizer(self) -> int:
+        """Computes r^(n^s) (mod n^(s+1)) for a fresh random r in Z_n^*.
+
+        :return: An integer containing a fresh randomizer.
+        """
+        r = mpz(randbelow(self.n - 1)) + 1
+
+        return powmod(r, self.n_s, self.n_s_1)
+
+    def precompute_randomizers(self, count: int, background: bool = False) -> Optional[Thread]:
+        """Precomputes randomizers so that future encryptions skip the expensive modular exponentiation.
+
+        Each precomputed randomizer is consumed by exactly one call to `encrypt`. Once the
+        precomputed randomizers run out, `encrypt` falls back to computing them on demand.
+
+        :param count: The number of randomizers to precompute.
+        :param background: Whether to precompute the randomizers in a background thread, making each available as soon as it is computed.
+        :return: The background thread if `background` is True, None otherwise.
+        """
+        if background:
+            thread = Thread(target=self.precompute_randomizers, args=(count,), daemon=True)
+            thread.start()
+
+            return thread
+
+        # Let GMP release the GIL so that a background thread runs alongside other Python work
+        context = get_context().copy()
+        context.allow_release_gil = True
+
+        with context:
+            for _ in range(count):
+                self._randomizers.append(self._gen_randomizer())
 
-    @int_to_mpz
     def encrypt(self, m: int) -> EncryptedNumber:
         """Encrypts a number.
 
         :param m: The plaintext to be encrypted.
         :return: An EncryptedNumber containing the encryption of `m`.
         """
-        # Choose random r in Z_n^*
-        r = mpz(randbelow(self.n - 1)) + 1
-        c = pow(self.n + 1, m, self.n_s_1) * pow(r, self.n_s, self.n_s_1) % self.n_s_1
+        m = m % self.n_s
+
+        # Use a precomputed randomizer if one is available
+        # (pop inside try so that concurrent callers cannot race on the last randomizer)
+        try:
+            r_n_s = self._randomizers.pop()
+        except IndexError:
+            r_n_s = self._gen_randomizer()
+
+        # An encryption of 0 is just the randomizer since (1 + n)^0 = 1
+        if m == 0:
+            return EncryptedNumber(value=r_n_s, public_key=self)
+
+        # Compute (1 + n)^m = sum_{k=0}^{s} C(m, k) * n^k (mod n^(s+1)) via the binomial theorem
+        # Terms with k > m are zero, so small plaintexts only need the first m + 1 terms
+        g_m = sum(comb(m, k) * n_k for k, n_k in enumerate(self._n_pow[:min(m, self.s) + 1])) % self.n_s_1
+        c = g_m * r_n_s % self.n_s_1
 
         return EncryptedNumber(value=c, public_key=self)
 
-    def encrypt_list(self, m_list: List[int]) -> List[EncryptedNumber]:
+    def encrypt_list(self, m_list: List[int], parallel: bool = False) -> List[EncryptedNumber]:
         """Encrypts each number in a list.
 
+        When `parallel` is True, the workers encrypt with copies of this PublicKey, which never
+        carry precomputed randomizers, so randomizers from `precompute_randomizers` are not used.
+
         :param m_list: A list of plaintexts to be encrypted.
+        :param parallel: Whether to spread the encryptions across a pool of worker processes.
         :return: A list containing an EncryptedNumber for each plaintext in `m_list`.
         """
+        if parallel:
+            # Workers encrypt with a copy of this key, so re-attach the results to this key
+            return [EncryptedNumber(value=c.value, public_key=self) for c in parallel_map(self.encrypt, m_list)]
+
         return [self.encrypt(m) for m in m_list]
 
+    def _params(self) -> Tuple[int, int, int, int, int]:
+        """Returns the parameters which define this PublicKey.
+
+        :return: A tuple containing `n`, `s`, `m`, `threshold`, and `delta`.
+        """
+        return self.n, self.s, self.m, self.threshold, self.delta
+
     def __eq__(self, other: Any) -> bool:
         """Returns whether this PublicKey is equal to `other`.
 
-        Two PublicKeys are equal when all attributes initialized in `__init__` are the same.
+        Two PublicKeys are equal when the parameters passed to `__init__` are the same.
 
         :param other: A PublicKey.
         :return: True if this PublicKey is equal to `other`, False otherwise.
@@ -193,20 +255,32 @@ class PublicKey:
         if not isinstance(other, PublicKey):
             return False
 
-        return self.__dict__ == other.__dict__
+        return self._params() == other._params()
 
     def __hash__(self) -> int:
         """Hashes this PublicKey.
 
-        The hash is a hash of a tuple of all attributes initialized in `__init__`.
+        The hash is a hash of a tuple of the parameters passed to `__init__`.
 
         :return: An integer representing the hash of this PublicKey.
         """
-        return hash(tuple(sorted(self.__dict__.items())))
+        return hash(self._params())
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Returns the state of this PublicKey for pickling and copying.
+
+        Precomputed randomizers are deliberately left out so that two copies of
+        the same PublicKey can never encrypt using the same randomizer.
+
+        :return: A dictionary containing the attributes of this PublicKey.
+        """
+        state = self.__dict__.copy()
+        state['_randomizers'] = []
+
+        return state
 
 
 class PrivateKeyShare:
-    @int_to_mpz
     def __init__(self, public_key: PublicKey, i: int, s_i: int):
         """Initializes the PrivateKeyShare and performs pre-computations.
 
@@ -215,8 +289,8 @@ class PrivateKeyShare:
         :param s_i: The y=f(i) value of this share generated using a polynomial via Shamir secret sharing.
         """
         self.public_key = public_key
-        self.i = i
-        self.s_i = s_i
+        self.i = mpz(i)
+        self.s_i = mpz(s_i)
         self.two_delta_s_i = 2 * self.public_key.delta * self.s_i
 
     def decrypt(self, c: EncryptedNumber) -> int:
@@ -225,7 +299,7 @@ class PrivateKeyShare:
         :param c: An EncryptedNumber.
         :return: An integer containing this PrivateKeyShare's portion of the decryption of `c`.
         """
-        return pow(c.value, self.two_delta_s_i, self.public_key.n_s_1)
+        return powmod(c.value, self.two_delta_s_i, self.public_key.n_s_1)
 
     def __eq__(self, other: Any) -> bool:
         """Returns whether this PrivateKeyShare is equal to `other`.
@@ -250,42 +324,39 @@ class PrivateKeyShare:
         return hash(tuple(sorted(self.__dict__.items())))
 
 
-@int_to_mpz
-def damgard_jurik_reduce(a: int, s: int, n: int) -> int:
+def damgard_jurik_reduce(a: int,
+                         s: int,
+                         n: int,
+                         n_pow: Optional[List[int]] = None,
+                         fact_inv: Optional[List[List[int]]] = None) -> int:
     """Computes i given a = (1 + n)^i (mod n^(s+1)).
 
     :param a: The integer a in the above equation.
     :param s: The integer s in the above equation.
     :param n: The integer n in the above equation.
+    :param n_pow: The powers n^0, n^1, ..., n^(s+1). Computed if not provided.
+    :param fact_inv: The inverses fact_inv[j][k] = (k!)^(-1) (mod n^j) for 0 <= k <= j <= s. Computed if not provided.
     :return: The integer i in the above equation.
     """
+    if n_pow is None:
+        n_pow = [mpz(n) ** p for p in range(s + 2)]
+
+    if fact_inv is None:
+        fact_inv = [[inv_mod(fac(k), n_pow[j]) for k in range(j + 1)] for j in range(s + 1)]
+
     def L(b: int) -> int:
         assert (b - 1) % n == 0
         return (b - 1) // n
 
-    @lru_cache(int(s))
-    @int_to_mpz
-    def n_pow(p: int) -> int:
-        return n ** p
-
-    @lru_cache(int(s))
-    @int_to_mpz
-    def fact(k: int) -> int:
-        return mpz(factorial(k))
-
     i = mpz(0)
     for j in range(1, s + 1):
-        j = mpz(j)
-
-        t_1 = L(a % n_pow(j + 1))
+        t_1 = L(a % n_pow[j + 1])
         t_2 = i
 
         for k in range(2, j + 1):
-            k = mpz(k)
-
             i = i - 1
-            t_2 = t_2 * i % n_pow(j)
-            t_1 = t_1 - (t_2 * n_pow(k - 1) * inv_mod(fact(k), n_pow(j))) % n_pow(j)
+            t_2 = t_2 * i % n_pow[j]
+            t_1 = t_1 - (t_2 * n_pow[k - 1] * fact_inv[j][k]) % n_pow[j]
 
         i = t_1
 
@@ -316,6 +387,18 @@ class PrivateKeyRing:
         self.S = set(self.i_list)
         self.inv_four_delta_squared = inv_mod(4 * (self.public_key.delta ** 2), self.public_key.n_s)
 
+        # Pre-compute the Lagrange coefficients, which only depend on the set of shares
+        # lambda_i = delta * prod_{i' != i} i' / prod_{i' != i} (i' - i)
+        # Since delta = n_shares!, each lambda_i is a small (possibly negative) integer, so
+        # it is kept exact rather than reduced to a full-size exponent modulo n^s * m
+        numerators = [prod(self.S - {i}) for i in self.i_list]
+        denominators = [prod([i_prime - i for i_prime in self.S - {i}]) for i in self.i_list]
+        self.lam_list = [
+            self.public_key.delta * numerator // denominator
+            for numerator, denominator in zip(numerators, denominators)
+        ]
+        self.two_lam_list = [2 * lam_i for lam_i in self.lam_list]
+
     def decrypt(self, c: EncryptedNumber) -> int:
         """Decrypts an EncryptedNumber.
 
@@ -325,40 +408,40 @@ class PrivateKeyRing:
         # Use PrivateKeyShares to decrypt
         c_list = [pk.decrypt(c) for pk in self.private_key_shares]
 
-        # Define lambda function
-        @int_to_mpz
-        def lam(i: int) -> int:
-            S_prime = self.S - {i}
-            l = self.public_key.delta % self.public_key.n_s_m
-
-            for i_prime in S_prime:
-                l = l * i_prime * inv_mod(i_prime - i, self.public_key.n_s_m) % self.public_key.n_s_m
-
-            return l
-
-        # Decrypt
+        # Decrypt (powmod inverts c_i when the exponent 2 * lambda_i is negative)
         c_prime = mpz(1)
-        for c_i, i in zip(c_list, self.i_list):
-            c_prime = (c_prime * pow_mod(c_i, (2 * lam(i)), self.public_key.n_s_1)) % self.public_key.n_s_1
-
-        c_prime = damgard_jurik_reduce(c_prime, self.public_key.s, self.public_key.n)
+        for c_i, two_lam_i in zip(c_list, self.two_lam_list):
+            c_prime = c_prime * powmod(c_i, two_lam_i, self.public_key.n_s_1) % self.public_key.n_s_1
+
+        c_prime = damgard_jurik_reduce(
+            a=c_prime,
+            s=self.public_key.s,
+            n=self.public_key.n,
+            n_pow=self.public_key._n_pow,
+            fact_inv=self.public_key._fact_inv
+        )
         m = c_prime * self.inv_four_delta_squared % self.public_key.n_s
 
         return m
 
-    def decrypt_list(self, c_list: List[EncryptedNumber]) -> List[int]:
+    def decrypt_list(self, c_list: List[EncryptedNumber], parallel: bool = False) -> List[int]:
         """Decrypts each number in a list.
 
         :param c_list: A list of EncryptedNumbers to be decrypted.
+        :param parallel: Whether to spread the decryptions across a pool of worker processes.
         :return: A list containing the decryption of each EncryptedNumber in `c_list`.
         """
+        if parallel:
+            return parallel_map(self.decrypt, c_list)
+
         return [self.decrypt(c) for c in c_list]
 
 
 def keygen(n_bits: int = 64,
            s: int = 1,
            threshold: int = 3,
-           n_shares: int = 3) -> Tuple[PublicKey, PrivateKeyRing]:
+           n_shares: int = 3,
+           parallel: bool = False) -> Tuple[PublicKey, PrivateKeyRing]:
     """Generates a PublicKey and a PrivateKeyRing using the threshold variant of Damgard-Jurik.
 
     The PublicKey is a single key which can be used to encrypt numbers
@@ -369,6 +452,7 @@ def keygen(n_bits: int = 64,
     :param s: The power to which n = p * q will be raised. Plaintexts live in Z_n^s.
     :param threshold: The minimum number of PrivateKeyShares needed to decrypt an encrypted number.
     :param n_shares: The number of PrivateKeyShares to generate.
+    :param parallel: Whether to generate the primes p and q simultaneously in two worker processes.
     :return: A tuple containing the generated PublicKey and PrivateKeyRing.
     """
     # Ensure valid parameters
@@ -376,7 +460,7 @@ def keygen(n_bits: int = 64,
         raise ValueError('Minimum number of bits for encryption is 16')
 
     if s < 1:
-        raise ValueError('s must be greater than 1')
+        raise ValueError('s must be at least 1')
 
     if n_shares < threshold:
         raise ValueError('The number of shares must be at least as large as the threshold')
@@ -385,7 +469,7 @@ def keygen(n_bits: int = 64,
         raise ValueError('The threshold and number of shares must be at least 1')
 
     # Find n = p * q and m = p_prime * q_prime where p = 2 * p_prime + 1 and q = 2 * q_prime + 1
-    p, q = gen_safe_prime_pair(n_bits)
+    p, q = gen_safe_prime_pair(n_bits, parallel=parallel)
     p_prime, q_prime = (p - 1) // 2, (q - 1) // 2
     n, m = p * q, p_prime * q_prime
 
@@ -405,7 +489,7 @@ def keygen(n_bits: int = 64,
     )
 
     # Create PublicKey and PrivateKeyShares
-    delta = factorial(n_shares)
+    delta = fac(n_shares)
     public_key = PublicKey(n=n, s=s, m=m, threshold=threshold, delta=delta)
     private_key_shares = [PrivateKeyShare(public_key=public_key, i=i, s_i=s_i) for i, s_i in shares]
     private_key_ring = PrivateKeyRing(private_key_shares=private_key_shares)
@@ -6,10 +6,16 @@ Boucher, Govedič, Saowakon, Swanson 2019
 Contains methods for generating prime numbers.
 
 """
+from concurrent.futures import ProcessPoolExecutor
 from secrets import randbits
 from typing import Tuple
 
-from gmpy2 import bit_set, is_prime, next_prime
+from gmpy2 import bit_set, gcd, is_prime, is_strong_prp, next_prime, primorial
+
+
+# Product of all primes up to SIEVE_BOUND, used to discard candidates with small prime factors
+SIEVE_BOUND = 1000
+SIEVE_PRIMORIAL = primorial(SIEVE_BOUND)
 
 
 def gen_prime(n_bits: int) -> int:
@@ -33,24 +39,43 @@ def gen_safe_prime(n_bits: int) -> int:
     :param n_bits: The number of bits the prime number should contain.
     :return: A safe prime with `n_bits` bits.
     """
+    if n_bits < 4:
+        raise ValueError('Safe primes must have at least 4 bits')
+
     while True:
-        q = gen_prime(n_bits - 1)
+        # Start from a random q with n_bits - 1 bits such that q = 5 (mod 6),
+        # which ensures that neither q nor p = 2 * q + 1 is divisible by 2 or 3
+        q = bit_set(randbits(n_bits - 1), n_bits - 2)
+        q += (5 - q) % 6
 
-        if is_prime(q):
+        # Scan q, q + 6, q + 12, ... until a safe prime is found or q has too many bits
+        while q.bit_length() == n_bits - 1:
             p = 2 * q + 1
 
-            if is_prime(p):
+            # Cheaply discard candidates where either q or p has a small prime factor
+            sieved = q <= SIEVE_BOUND or gcd(q * p, SIEVE_PRIMORIAL) == 1
+
+            # Run a single base-2 test on both q and p before the full Miller-Rabin tests,
+            # so that a prime q is not fully verified only for p to turn out composite
+            if sieved and is_strong_prp(q, 2) and is_strong_prp(p, 2) and is_prime(q) and is_prime(p):
                 return p
 
+            q += 6
+
 
-def gen_safe_prime_pair(n_bits: int) -> Tuple[int, int]:
+def gen_safe_prime_pair(n_bits: int, parallel: bool = False) -> Tuple[int, int]:
     """Returns a pair of two different safe primes with `n_bits` bits.
 
     :param n_bits: The number of bits the prime number should contain.
+    :param parallel: Whether to search for the two safe primes simultaneously in two worker processes.
     :return: A tuple of two different safe primes, each with `n_bits` bits.
     """
-    p = gen_safe_prime(n_bits)
-    q = gen_safe_prime(n_bits)
+    if parallel:
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            p, q = executor.map(gen_safe_prime, [n_bits, n_bits])
+    else:
+        p = gen_safe_prime(n_bits)
+        q = gen_safe_prime(n_bits)
 
     while p == q:
         q = gen_safe_prime(n_bits)
@@ -11,7 +11,7 @@ from typing import List, Tuple
 
 from gmpy2 import mpz
 
-from damgard_jurik.utils import int_to_mpz, inv_mod
+from damgard_jurik.utils import int_to_mpz, inv_mod_list
 
 
 class Polynomial:
@@ -34,10 +34,11 @@ class Polynomial:
         :param x: The input to the polynomial.
         :return: The integer f(x) where f is this polynomial.
         """
+        # Evaluate using Horner's method, starting from the highest-degree coefficient
         f_x = mpz(0)
 
-        for i, c_i in enumerate(self.coeffs):
-            f_x = (f_x + c_i * pow(x, mpz(i), self.modulus) % self.modulus) % self.modulus
+        for c_i in reversed(self.coeffs):
+            f_x = (f_x * x + c_i) % self.modulus
 
         return f_x
 
@@ -90,15 +91,25 @@ def reconstruct(shares: List[Tuple[int, int]],
     # Convert to mpz
     shares = [(mpz(x), mpz(f_x)) for x, f_x in shares]
 
-    # Reconstruct secret
-    secret = mpz(0)
-    for i, (x_i, f_x_i) in enumerate(shares):
-        product = mpz(1)
+    # Compute the numerator and denominator of each Lagrange coefficient
+    numerators, denominators = [], []
+    for i, (x_i, _) in enumerate(shares):
+        numerator, denominator = mpz(1), mpz(1)
 
         for j, (x_j, _) in enumerate(shares):
             if i != j:
-                product = product * x_j * inv_mod(x_j - x_i, modulus) % modulus
+                numerator = numerator * x_j % modulus
+                denominator = denominator * (x_j - x_i) % modulus
+
+        numerators.append(numerator)
+        denominators.append(denominator)
 
-        secret = (secret + f_x_i * product % modulus) % modulus
+    # Invert all the denominators with a single modular inversion
+    inv_denominators = inv_mod_list(denominators, modulus)
+
+    # Reconstruct secret
+    secret = mpz(0)
+    for (_, f_x_i), numerator, inv_denominator in zip(shares, numerators, inv_denominators):
+        secret = (secret + f_x_i * numerator * inv_denominator) % modulus
 
     return secret
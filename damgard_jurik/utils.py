@@ -7,10 +7,10 @@ Contains useful mathematical utility functions.
 
 """
 from functools import wraps
-from math import gcd
-from typing import Callable, List, Tuple
+from multiprocessing import Pool, cpu_count
+from typing import Any, Callable, Iterable, List, Tuple
 
-from gmpy2 import mpz
+from gmpy2 import gcdext, invert, mpz, powmod
 
 
 def int_to_mpz(func: Callable) -> Callable:
@@ -26,21 +26,42 @@ def int_to_mpz(func: Callable) -> Callable:
     return func_wrapper
 
 
+def parallel_map(func: Callable, items: Iterable[Any]) -> List[Any]:
+    """Applies a function to each item using a pool of worker processes.
+
+    Items are handed to the workers in chunks so that the cost of pickling is amortized.
+
+    :param func: A picklable function to apply to each item.
+    :param items: The items to which `func` will be applied.
+    :return: A list containing the result of applying `func` to each item in `items`, in order.
+    """
+    items = list(items)
+    chunksize = max(1, len(items) // (4 * cpu_count()))
+
+    with Pool() as pool:
+        return pool.map(func, items, chunksize=chunksize)
+
+
 def prod(nums: List[int]) -> int:
     """Returns the product of the numbers in the list.
 
+    Multiplies pairs of numbers in a balanced tree so that each multiplication
+    is between operands of similar size, which is much faster for large inputs.
+
     :param nums: A list of integers.
     :return: The product of the numbers in `nums`.
     """
-    product = mpz(1)
+    nums = [mpz(num) for num in nums]
 
-    for num in nums:
-        product *= num
+    if len(nums) == 0:
+        return mpz(1)
 
-    return product
+    while len(nums) > 1:
+        nums = [nums[i] * nums[i + 1] if i + 1 < len(nums) else nums[i] for i in range(0, len(nums), 2)]
+
+    return nums[0]
 
 
-@int_to_mpz
 def pow_mod(a: int, b: int, m: int) -> int:
     """Computes a^b (mod m).
 
@@ -53,30 +74,21 @@ def pow_mod(a: int, b: int, m: int) -> int:
         a = inv_mod(a, m)
         b = -b
 
-    return pow(a, b, m)
+    return powmod(a, b, m)
 
 
-@int_to_mpz
 def extended_euclidean(a: int, b: int) -> Tuple[int, int]:
     """Uses the Extended Euclidean Algorithm to compute x and y such that ax + by = gcd(a, b).
 
-    https://en.wikibooks.org/wiki/Algorithm_Implementation/Mathematics/Extended_Euclidean_algorithm#Python
-
     :param a: The integer a in the above equation.
     :param b: The integer b in the above equation.
     :return: A tuple of integers x and y such that ax + by = gcd(a, b).
     """
-    x0, x1, y0, y1 = mpz(0), mpz(1), mpz(1), mpz(0)
+    _, x, y = gcdext(a, b)
 
-    while a != 0:
-        q, b, a = b // a, a, b % a
-        y0, y1 = y1, y0 - q * y1
-        x0, x1 = x1, x0 - q * x1
+    return x, y
 
-    return x0, y0
 
-
-@int_to_mpz
 def inv_mod(a: int, m: int) -> int:
     """Finds the inverse of a modulo m (i.e. b s.t. a*b = 1 (mod m)).
 
@@ -84,17 +96,36 @@ def inv_mod(a: int, m: int) -> int:
     :param m: The modulus.
     :return: The inverse of a modulo m.
     """
-    if a < 0:
-        a = m + a
-
     # a and m must be coprime to find an inverse
-    if gcd(a, m) != 1:
-        raise Exception(f'modular inverse does not exist since {a} and {m} are not coprime')
+    try:
+        return invert(a, m)
+    except ZeroDivisionError:
+        raise Exception(f'modular inverse does not exist since {a} and {m} are not coprime') from None
+
 
-    x, _ = extended_euclidean(a, m)
-    x_inv = x % m
+def inv_mod_list(a_list: List[int], m: int) -> List[int]:
+    """Finds the inverse of each a_i modulo m using a single modular inversion.
 
-    return x_inv
+    Uses Montgomery's trick: the product of all a_i is inverted once and each
+    individual inverse is then recovered using only multiplications.
+
+    :param a_list: A list of integers whose inverses will be found.
+    :param m: The modulus.
+    :return: A list containing the inverse of each a_i modulo m.
+    """
+    # prefix_prods[j] = a_0 * a_1 * ... * a_(j-1) (mod m)
+    prefix_prods = [mpz(1)]
+    for a_i in a_list:
+        prefix_prods.append(prefix_prods[-1] * a_i % m)
+
+    # Invert the full product, then peel off one a_i at a time from the back
+    inv = inv_mod(prefix_prods[-1], m)
+    inv_list = [mpz(0)] * len(a_list)
+    for j in reversed(range(len(a_list))):
+        inv_list[j] = inv * prefix_prods[j] % m
+        inv = inv * a_list[j] % m
+
+    return inv_list
 
 
 def crm(a_list: List[int], n_list: List[int]) -> int:
@@ -104,9 +135,6 @@ def crm(a_list: List[int], n_list: List[int]) -> int:
     :param n_list: A list of integers b_i in the above equation.
     :return: The unique integer x such that x = a_i (mod n_i) for all i.
     """
-    a_list = [mpz(a_i) for a_i in a_list]
-    n_list = [mpz(n_i) for n_i in n_list]
-
     N = prod(n_list)
     y_list = [N // n_i for n_i in n_list]
     z_list = [inv_mod(y_i, n_i) for y_i, n_i in zip(y_list, n_list)]
@@ -6,12 +6,44 @@ Boucher, Govedič, Saowakon, Swanson 2019
 Contains unit tests for the damgard-jurik package.
 
 """
+from copy import deepcopy
+from math import gcd
+import pickle
 from secrets import randbelow
 import unittest
 
 from damgard_jurik import keygen
 from damgard_jurik.prime_gen import gen_prime
 from damgard_jurik.shamir import Polynomial, reconstruct, share_secret
+from damgard_jurik.utils import extended_euclidean, inv_mod, inv_mod_list, prod
+
+
+class TestUtils(unittest.TestCase):
+    def test_prod(self):
+        self.assertEqual(prod([]), 1)
+
+        for _ in range(10):
+            nums = [randbelow(2 ** 256) for _ in range(randbelow(20) + 1)]
+
+            expected = 1
+            for num in nums:
+                expected *= num
+
+            self.assertEqual(prod(nums), expected)
+
+    def test_extended_euclidean(self):
+        for _ in range(10):
+            a, b = randbelow(2 ** 256), randbelow(2 ** 256)
+            x, y = extended_euclidean(a, b)
+
+            self.assertEqual(a * x + b * y, gcd(a, b))
+
+    def test_inv_mod_list(self):
+        for _ in range(10):
+            modulus = gen_prime(n_bits=64)
+            a_list = [randbelow(modulus - 1) + 1 for _ in range(randbelow(10) + 1)]
+
+            self.assertEqual(inv_mod_list(a_list, modulus), [inv_mod(a_i, modulus) for a_i in a_list])
 
 
 class TestShamir(unittest.TestCase):
@@ -54,6 +86,62 @@ class TestDamgardJurik(unittest.TestCase):
 
             self.assertEqual(m, m_prime)
 
+    def test_encrypt_decrypt_edge_cases(self):
+        for s in range(1, 5):
+            public_key, private_key_ring = keygen(n_bits=32, s=s, threshold=3, n_shares=5)
+
+            for m in list(range(s + 1)) + [-1, public_key.n_s, public_key.n_s + 7]:
+                self.assertEqual(private_key_ring.decrypt(public_key.encrypt(m)), m % public_key.n_s)
+
+    def test_parallel_keygen(self):
+        public_key, private_key_ring = keygen(n_bits=32, s=2, threshold=3, n_shares=5, parallel=True)
+
+        m = randbelow(public_key.n_s)
+        self.assertEqual(m, private_key_ring.decrypt(public_key.encrypt(m)))
+
+    def test_parallel_encrypt_decrypt_list(self):
+        public_key, private_key_ring = keygen(n_bits=32, s=2, threshold=3, n_shares=5)
+
+        m_list = [randbelow(public_key.n_s) for _ in range(20)]
+        c_list = public_key.encrypt_list(m_list, parallel=True)
+
+        self.assertTrue(all(c.public_key is public_key for c in c_list))
+        self.assertEqual(m_list, private_key_ring.decrypt_list(c_list, parallel=True))
+
+    def test_precompute_randomizers(self):
+        public_key, private_key_ring = keygen(n_bits=32, s=2, threshold=3, n_shares=5)
+        public_key.precompute_randomizers(5)
+
+        m_list = [randbelow(public_key.n_s) for _ in range(10)]
+        c_list = public_key.encrypt_list(m_list)
+
+        self.assertEqual(len(public_key._randomizers), 0)
+        self.assertEqual(len({c.value for c in c_list}), len(c_list))
+        self.assertEqual(m_list, private_key_ring.decrypt_list(c_list))
+
+    def test_randomizers_not_copied(self):
+        public_key, _ = keygen(n_bits=32, s=2, threshold=3, n_shares=5)
+        public_key.precompute_randomizers(5)
+
+        for public_key_copy in [deepcopy(public_key), pickle.loads(pickle.dumps(public_key))]:
+            self.assertEqual(public_key_copy, public_key)
+            self.assertEqual(len(public_key_copy._randomizers), 0)
+
+        self.assertEqual(len(public_key._randomizers), 5)
+
+    def test_precompute_randomizers_background(self):
+        public_key, private_key_ring = keygen(n_bits=32, s=2, threshold=3, n_shares=5)
+        thread = public_key.precompute_randomizers(5, background=True)
+        thread.join()
+
+        self.assertEqual(len(public_key._randomizers), 5)
+
+        m_list = [randbelow(public_key.n_s) for _ in range(3)]
+        c_list = public_key.encrypt_list(m_list)
+
+        self.assertEqual(len(public_key._randomizers), 2)
+        self.assertEqual(m_list, private_key_ring.decrypt_list(c_list))
+
 
 class TestDamgardJurikHomomorphic(unittest.TestCase):
     def setUp(self):